@@ -1,7 +1,36 @@
 import json
+import math
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
+
+# (signal name, stats counter field, category)
+SIGNALS = [
+    ("formation_oui_pct", "sec1/formation_genre", "Oui"),
+    ("cellule_genre_oui_pct", "sec3/cellule_genre", "Oui"),
+    ("plan_action_oui_pct", "sec3/plan_action_genre", "Oui"),
+    ("plan_action_np_pct", "sec3/plan_action_genre", "Partiellement / Je ne sais pas"),
+    ("indicateurs_oui_pct", "sec3/indicateurs_genre", "Oui"),
+    ("indicateurs_np_pct", "sec3/indicateurs_genre", "Partiellement / Je ne sais pas"),
+    ("outils_oui_pct", "sec3/outils_guide_genre", "Oui"),
+    ("politiques_connues_oui_pct", "sec2/politiques_genre_connaissance", "Oui"),
+    ("gtg_connu_oui_pct", "sec5/gtg_connaissance", "Oui"),
+]
+
+# (segment dimension, flat field)
+SEGMENTS = [
+    ("ministere", "sec1/ministere"),  # mapped label: free-text "Autre : ..." stays one segment
+    ("fonction", "sec1/fonction"),
+    ("sexe", "sec1/sexe"),
+]
+
+CI_LEVEL = 0.95
+CI_Z = 1.959964
+BOOTSTRAP_RESAMPLES = 4000
+BOOTSTRAP_SEED = 2026  # fixed so that unchanged data gives unchanged artifacts
+MIN_SEGMENT_N = 5      # below this, the bootstrap degenerates: segment is reported without rules
+
 
 def pct(counter: dict, key: str):
     """
@@ -16,6 +45,145 @@ def pct(counter: dict, key: str):
     return round((counter.get(key, 0) / total) * 100)
 
 
+def count_pair(counter: dict, key: str):
+    """
+    (count of category, total excluding _missing) from a counter dict.
+    """
+    total = sum(v for k, v in (counter or {}).items() if k != "_missing")
+    return (counter or {}).get(key, 0), total
+
+
+def wilson(k: int, n: int, z: float = CI_Z):
+    """
+    Wilson score interval for k/n, in percent. Returns (lo, hi) or None if n == 0.
+    """
+    if not n:
+        return None
+    p = k / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return (max(center - half, 0.0) * 100, min(center + half, 1.0) * 100)
+
+
+def wilson_arrays(k, n, z: float = CI_Z):
+    """
+    Same as wilson() over arrays of counts (n must be > 0).
+    """
+    p = k / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return np.clip(center - half, 0, 1) * 100, np.clip(center + half, 0, 1) * 100
+
+
+def bootstrap_intervals(k, n, resamples: int = BOOTSTRAP_RESAMPLES, level: float = CI_LEVEL,
+                        seed: int = BOOTSTRAP_SEED):
+    """
+    Percentile bootstrap intervals (in percent) for many proportions k/n at once.
+    Resampling n binary answers with replacement and counting the hits is a Binomial(n, k/n)
+    draw, so every proportion x resample is drawn in a single array operation.
+    When k is 0 or n every draw is identical and the percentile interval has zero width:
+    those entries use the Wilson interval instead.
+    Returns (lo, hi) arrays; entries with n == 0 are NaN.
+    """
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=np.int64)
+    safe_n = np.maximum(n, 1)
+    rng = np.random.default_rng(seed)
+    draws = rng.binomial(safe_n[:, None], (k / safe_n)[:, None], size=(len(n), resamples))
+    alpha = (1 - level) / 2
+    lo, hi = np.quantile(draws, [alpha, 1 - alpha], axis=1) / safe_n * 100
+    degenerate = (n > 0) & ((k == 0) | (k == n))
+    lo[degenerate], hi[degenerate] = wilson_arrays(k[degenerate], n[degenerate])
+    lo[n == 0] = np.nan
+    hi[n == 0] = np.nan
+    return lo, hi
+
+
+def _columns(rows: list, fields: list) -> dict:
+    """
+    Answer columns for several fields in a single pass over the rows.
+    Each field maps to (labels, codes): its sorted distinct answers ("" for missing, same
+    convention as transform.count_single) and, per row, the index of the row's answer in labels.
+    Raw values are only normalized once per distinct value, not once per row.
+    """
+    seen = {f: {} for f in fields}
+    codes = {f: [] for f in fields}
+    cols = [(f, seen[f], codes[f].append) for f in fields]
+    for r in rows:
+        get = r.get
+        for f, index, append in cols:
+            v = get(f)
+            code = index.get(v)
+            if code is None:
+                code = index[v] = len(index)
+            append(code)
+
+    out = {}
+    for f in fields:
+        raw = ["" if v is None else str(v).strip() for v in seen[f]]
+        labels, remap = np.unique(np.array(raw, dtype=str), return_inverse=True)
+        out[f] = (labels, remap[np.array(codes[f], dtype=np.intp)])
+    return out
+
+
+def segment_signals(flat_rows: list, min_n: int = MIN_SEGMENT_N) -> list:
+    """
+    Signals, bootstrap intervals and rule-based recommendations per segment
+    (each value of each SEGMENTS dimension). Counting is done with bincount per
+    dimension x signal; the bootstrap runs once over all segment x signal pairs.
+    Segments smaller than min_n get neither intervals nor rules.
+    """
+    if not flat_rows:
+        return []
+
+    columns = _columns(flat_rows, sorted({f for _, f, _ in SIGNALS} | {f for _, f in SEGMENTS}))
+
+    # Per signal: does each row answer the question at all, and with the signal's category?
+    valid, hits = [], []
+    for _, field, key in SIGNALS:
+        labels, codes = columns[field]
+        valid.append((labels != "")[codes])
+        hits.append((labels == key)[codes])
+
+    groups, sizes, n_blocks, k_blocks = [], [], [], []
+    for dim, field in SEGMENTS:
+        labels, inv = columns[field]
+        groups.extend((dim, label or "_missing") for label in labels)
+        sizes.append(np.bincount(inv, minlength=len(labels)))
+        n_blocks.append(np.stack([np.bincount(inv, weights=w, minlength=len(labels)) for w in valid], axis=1))
+        k_blocks.append(np.stack([np.bincount(inv, weights=w, minlength=len(labels)) for w in hits], axis=1))
+
+    sizes = np.concatenate(sizes)
+    n_mat = np.concatenate(n_blocks).astype(np.int64)
+    k_mat = np.concatenate(k_blocks)
+    lo, hi = bootstrap_intervals(k_mat.ravel(), n_mat.ravel())
+    lo, hi = lo.reshape(n_mat.shape), hi.reshape(n_mat.shape)
+
+    out = []
+    for g, (dim, label) in enumerate(groups):
+        signals, intervals = {}, {}
+        for j, (name, _, _) in enumerate(SIGNALS):
+            n = n_mat[g, j]
+            signals[name] = round(k_mat[g, j] / n * 100) if n else None
+            intervals[name] = (float(lo[g, j]), float(hi[g, j])) if n else None
+        enough = sizes[g] >= min_n
+        out.append({
+            "dimension": dim,
+            "label": label,
+            "n": int(sizes[g]),
+            "signals": signals,
+            "intervals": round_intervals(intervals) if enough else None,
+            "recommendations": build_recommendations(signals, [], [], intervals) if enough else [],
+        })
+    return out
+
+
+def round_intervals(intervals: dict) -> dict:
+    return {name: None if iv is None else [round(iv[0]), round(iv[1])] for name, iv in intervals.items()}
+
+
 def top_items(d: dict, n=8):
     """
     Returns top N items from a dict (label->count), excluding _missing.
@@ -33,32 +201,39 @@ def safe_get_multi(stats: dict, key: str) -> dict:
     return (stats.get("multi") or {}).get(key) or {}
 
 
-def build_recommendations(signals: dict, top_obstacles: list, top_actions: list):
+def build_recommendations(signals: dict, top_obstacles: list, top_actions: list, intervals: dict = None):
     """
     Rule-based global recommendations. Returns list[str] in priority order.
+    With intervals (signal -> (lo, hi) in percent), a threshold only counts as crossed
+    when the whole interval clears it; without, the point estimates are used.
     """
     recos = []
+    intervals = intervals or {}
+
+    def bounds(name):
+        if name in intervals:
+            return intervals[name] or (None, None)
+        return signals.get(name), signals.get(name)
 
-    cellule = signals.get("cellule_genre_oui_pct")
-    plan_oui = signals.get("plan_action_oui_pct")
-    plan_np = signals.get("plan_action_np_pct")
-    ind_oui = signals.get("indicateurs_oui_pct")
-    ind_np = signals.get("indicateurs_np_pct")
-    outils = signals.get("outils_oui_pct")
-    formation = signals.get("formation_oui_pct")
-    politiques = signals.get("politiques_connues_oui_pct")
-    gtg = signals.get("gtg_connu_oui_pct")
+    def below(name, threshold):
+        # No data keeps the rule active
+        hi = bounds(name)[1]
+        return hi is None or hi < threshold
+
+    def above(name, threshold):
+        lo = bounds(name)[0]
+        return lo is not None and lo >= threshold
 
     # 1) Gouvernance / dispositif institutionnel
-    if cellule is None or cellule < 60:
+    if below("cellule_genre_oui_pct", 60):
         recos.append(
             "Institutionnaliser une Cellule Genre dans chaque ministère (mandat, ToR, points focaux, mécanisme de reporting) "
             "et formaliser la chaîne de redevabilité."
         )
 
     # 2) Planification
-    if plan_oui is None or plan_oui < 55:
-        if (plan_np or 0) >= 20:
+    if below("plan_action_oui_pct", 55):
+        if above("plan_action_np_pct", 20):
             recos.append(
                 "Convertir les éléments partiels liés au plan/stratégie genre en document formalisé (objectifs, activités, coûts, "
                 "échéancier, responsables) et instaurer une revue trimestrielle."
@@ -70,8 +245,8 @@ def build_recommendations(signals: dict, top_obstacles: list, top_actions: list)
             )
 
     # 3) Indicateurs & données
-    if ind_oui is None or ind_oui < 55:
-        if (ind_np or 0) >= 20:
+    if below("indicateurs_oui_pct", 55):
+        if above("indicateurs_np_pct", 20):
             recos.append(
                 "Standardiser l’intégration d’indicateurs sensibles au genre dans les programmes (minimum commun) et renforcer "
                 "la désagrégation par sexe (collecte, analyse, reporting)."
@@ -83,28 +258,28 @@ def build_recommendations(signals: dict, top_obstacles: list, top_actions: list)
             )
 
     # 4) Outils opérationnels
-    if outils is None or outils < 60:
+    if below("outils_oui_pct", 60):
         recos.append(
             "Déployer un kit d’outils opérationnels (checklist mainstreaming, fiche projet, grille d’analyse, modèle rapport) "
             "accessible à tous (drive/portail) et accompagné d’un guide court."
         )
 
     # 5) Capacités
-    if formation is None or formation < 60:
+    if below("formation_oui_pct", 60):
         recos.append(
             "Mettre en œuvre un plan de renforcement des capacités (sessions courtes + coaching sur cas réels), différencié "
             "selon les profils (SG, directions, divisions, agents)."
         )
 
     # 6) Appropriation des politiques
-    if politiques is None or politiques < 60:
+    if below("politiques_connues_oui_pct", 60):
         recos.append(
             "Renforcer l’appropriation des politiques genre (CEDAW, Beijing, Rés. 1325, cadres nationaux) via fiches synthèse, "
             "sessions d’appropriation et intégration dans les processus internes."
         )
 
     # 7) Coordination / GTG
-    if gtg is None or gtg < 60:
+    if below("gtg_connu_oui_pct", 60):
         recos.append(
             "Accroître la visibilité et la participation au Groupe Thématique du Genre (GTG) et aux sous-groupes via onboarding, "
             "calendrier partagé et points de contact par ministère."
@@ -136,57 +311,51 @@ def build_recommendations(signals: dict, top_obstacles: list, top_actions: list)
     return out
 
 
-def main():
-    stats_path = Path("docs/data/stats.json")
-    out_path = Path("docs/data/recommendations_global.json")
-
-    if not stats_path.exists():
-        raise FileNotFoundError(f"Missing file: {stats_path}. Run transform.py first.")
-
-    stats = json.loads(stats_path.read_text(encoding="utf-8"))
+def build_payload(stats: dict, flat_rows: list) -> dict:
+    """
+    recommendations_global.json payload from stats.json and the flat rows (for segments).
+    """
     n = stats.get("n", 0)
 
-    # Counters
-    consent = safe_get_counter(stats, "consent")  # may not exist; ok
-    formation_counter = safe_get_counter(stats, "sec1/formation_genre")
-    cellule_counter = safe_get_counter(stats, "sec3/cellule_genre")
-    plan_counter = safe_get_counter(stats, "sec3/plan_action_genre")
-    indic_counter = safe_get_counter(stats, "sec3/indicateurs_genre")
-    outils_counter = safe_get_counter(stats, "sec3/outils_guide_genre")
-    pol_counter = safe_get_counter(stats, "sec2/politiques_genre_connaissance")
-    gtg_counter = safe_get_counter(stats, "sec5/gtg_connaissance")
-
     # Multi
     obstacles_multi = safe_get_multi(stats, "sec4/obstacles_display")
     actions_multi = safe_get_multi(stats, "sec4/actions_display")
 
     # Signals
-    signals = {
-        "formation_oui_pct": pct(formation_counter, "Oui"),
-        "cellule_genre_oui_pct": pct(cellule_counter, "Oui"),
-        "plan_action_oui_pct": pct(plan_counter, "Oui"),
-        "plan_action_np_pct": pct(plan_counter, "Partiellement / Je ne sais pas"),
-        "indicateurs_oui_pct": pct(indic_counter, "Oui"),
-        "indicateurs_np_pct": pct(indic_counter, "Partiellement / Je ne sais pas"),
-        "outils_oui_pct": pct(outils_counter, "Oui"),
-        "politiques_connues_oui_pct": pct(pol_counter, "Oui"),
-        "gtg_connu_oui_pct": pct(gtg_counter, "Oui"),
-    }
+    signals = {name: pct(safe_get_counter(stats, field), key) for name, field, key in SIGNALS}
+    intervals = {name: wilson(*count_pair(safe_get_counter(stats, field), key)) for name, field, key in SIGNALS}
 
     top_obstacles = [{"label": k, "count": v} for k, v in top_items(obstacles_multi, 8)]
     top_actions = [{"label": k, "count": v} for k, v in top_items(actions_multi, 8)]
 
-    recos = build_recommendations(signals, top_obstacles, top_actions)
+    recos = build_recommendations(signals, top_obstacles, top_actions, intervals)
+    segments = segment_signals(flat_rows)
 
-    payload = {
+    return {
         "generated_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
         "n": n,
         "signals": signals,
+        "intervals": round_intervals(intervals),
+        "ci": {"level": CI_LEVEL, "global": "wilson", "segments": "bootstrap", "resamples": BOOTSTRAP_RESAMPLES},
         "top_obstacles": top_obstacles,
         "top_actions": top_actions,
         "recommendations": recos,
+        "segments": segments,
     }
 
+
+def main():
+    stats_path = Path("docs/data/stats.json")
+    flat_path = Path("docs/data/submissions_flat.json")
+    out_path = Path("docs/data/recommendations_global.json")
+
+    if not stats_path.exists():
+        raise FileNotFoundError(f"Missing file: {stats_path}. Run transform.py first.")
+
+    stats = json.loads(stats_path.read_text(encoding="utf-8"))
+    flat_rows = json.loads(flat_path.read_text(encoding="utf-8")) if flat_path.exists() else []
+    payload = build_payload(stats, flat_rows)
+
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
     print(f"Wrote -> {out_path}")
@@ -1,19 +1,30 @@
 import os
 import json
+import hashlib
 import time
 from pathlib import Path
 import requests
 
+from transform import SOURCE_FIELDS
+
+# Lightweight reconciliation pass: only what is needed to diff against the local store.
+# meta/instanceID changes on every edit (_uuid may be the root uuid, which does not).
+INDEX_FIELDS = ["_id", "meta/instanceID", "_validation_status"]
+REJECTED_STATUS = "validation_status_not_approved"
+GROUP_BEGIN = {"begin_group", "begin group", "begin_repeat", "begin repeat"}
+GROUP_END = {"end_group", "end group", "end_repeat", "end repeat"}
+
 def require_env(name: str) -> str:
     v = os.getenv(name)
     if not v:
         raise SystemExit(f"Missing env var: {name}")
     return v
 
-def fetch_all_submissions(server: str, asset_uid: str, token: str, page_size: int = 300):
+def fetch_all_submissions(server: str, asset_uid: str, token: str, page_size: int = 300,
+                          fields=None, query=None):
     """
     Kobo v2 data endpoint supports pagination via 'limit' and 'start'.
-    We fetch all results to keep it simple and robust.
+    Optional 'fields' (projection) and 'query' (Mongo-style filter) are passed as JSON.
     """
     base_url = f"{server.rstrip('/')}/api/v2/assets/{asset_uid}/data/"
     headers = {"Authorization": f"Token {token}"}
@@ -24,6 +35,10 @@ def fetch_all_submissions(server: str, asset_uid: str, token: str, page_size: in
 
     while True:
         params = {"format": "json", "limit": page_size, "start": start}
+        if fields:
+            params["fields"] = json.dumps(fields)
+        if query:
+            params["query"] = json.dumps(query)
         r = requests.get(base_url, headers=headers, params=params, timeout=60)
         r.raise_for_status()
         payload = r.json()
@@ -31,7 +46,10 @@ def fetch_all_submissions(server: str, asset_uid: str, token: str, page_size: in
         if total_count is None:
             total_count = payload.get("count", 0)
 
-        results = payload.get("results", [])
+        results = payload.get("results")
+        if not isinstance(results, list):
+            # An empty index would read as "everything was deleted": never guess
+            raise ValueError(f"Unexpected Kobo payload (no 'results' list): {str(payload)[:200]}")
         all_results.extend(results)
 
         # Kobo returns "next": null when finished (sometimes), but we don't rely only on it
@@ -48,6 +66,118 @@ def fetch_all_submissions(server: str, asset_uid: str, token: str, page_size: in
 
     return {"count": len(all_results), "results": all_results}
 
+def fetch_form_fields(server: str, asset_uid: str, token: str) -> list:
+    """
+    Fields to request: SOURCE_FIELDS plus every sec* question of the deployed form
+    (asset content.survey), so questions added in a new form version are fetched too.
+    """
+    url = f"{server.rstrip('/')}/api/v2/assets/{asset_uid}/"
+    r = requests.get(url, headers={"Authorization": f"Token {token}"}, params={"format": "json"}, timeout=60)
+    r.raise_for_status()
+    survey = (r.json().get("content") or {}).get("survey")
+    if not isinstance(survey, list):
+        raise ValueError("Unexpected Kobo asset payload (no content.survey list)")
+
+    fields = list(SOURCE_FIELDS)
+    groups = []
+    for row in survey:
+        kind = row.get("type", "")
+        name = row.get("name") or row.get("$autoname")
+        if kind in GROUP_BEGIN:
+            groups.append(name)
+            continue
+        if kind in GROUP_END:
+            if groups:
+                groups.pop()
+            continue
+        if not name or kind == "note":
+            continue
+        xpath = row.get("$xpath") or "/".join(groups + [name])
+        if xpath.startswith("sec") and xpath not in fields:
+            fields.append(xpath)
+    return fields
+
+def is_rejected(rec: dict) -> bool:
+    status = rec.get("_validation_status") or {}
+    return status.get("uid") == REJECTED_STATUS
+
+def project(rec: dict, fields=SOURCE_FIELDS) -> dict:
+    return {k: rec[k] for k in fields if k in rec}
+
+def fields_fingerprint(fields: list) -> str:
+    return hashlib.sha1(json.dumps(sorted(fields)).encode("utf-8")).hexdigest()[:12]
+
+def load_local(path: Path) -> dict:
+    """
+    Payload of a previous sync ({"fields_fingerprint", "results", ...}), {} if there is none.
+    """
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def sync_submissions(server: str, asset_uid: str, token: str, local: dict,
+                     page_size: int = 300, chunk_size: int = 100):
+    """
+    Brings a previous sync payload in line with the server without a full re-pull:
+    - field list read from the deployed form; if it differs from the one the local rows were
+      fetched with, they are dropped and everything is re-pulled (rows are never backfilled otherwise),
+    - id-only pass (_id, meta/instanceID, _validation_status) over every submission,
+    - new submissions (_id above the local high-water mark) fetched with field projection,
+    - edited ones (meta/instanceID changed) re-fetched by id,
+    - deleted or rejected ones dropped.
+    Returns (data, changes).
+    """
+    fields = fetch_form_fields(server, asset_uid, token)
+    fingerprint = fields_fingerprint(fields)
+    local_results = local.get("results", [])
+    if local_results and local.get("fields_fingerprint") != fingerprint:
+        print("Field list changed since the last sync: full re-pull")
+        local_results = []
+
+    index = fetch_all_submissions(server, asset_uid, token, page_size=5000, fields=INDEX_FIELDS)["results"]
+    alive = [r for r in index if not is_rejected(r)]
+
+    local = {r["_id"]: project(r, fields) for r in local_results if "_id" in r}
+    max_id = max(local, default=0)
+    fetched = {}
+
+    # 1) New submissions
+    if any(r["_id"] > max_id for r in alive):
+        payload = fetch_all_submissions(server, asset_uid, token, page_size=page_size,
+                                        fields=fields, query={"_id": {"$gt": max_id}})
+        fetched.update((r["_id"], r) for r in payload["results"])
+
+    # 2) Older submissions edited on the server (or missing locally, e.g. un-rejected)
+    stale = [
+        r["_id"] for r in alive
+        if r["_id"] <= max_id
+        and (r["_id"] not in local or local[r["_id"]].get("meta/instanceID") != r.get("meta/instanceID"))
+    ]
+    for i in range(0, len(stale), chunk_size):
+        payload = fetch_all_submissions(server, asset_uid, token, page_size=page_size,
+                                        fields=fields, query={"_id": {"$in": stale[i:i + chunk_size]}})
+        fetched.update((r["_id"], r) for r in payload["results"])
+
+    results = []
+    changes = {"added": 0, "updated": 0, "removed": 0}
+    for r in alive:
+        rec = fetched.get(r["_id"]) or local.get(r["_id"])
+        if rec is None:
+            continue  # deleted between the id pass and the fetch
+        rec = project(rec, fields)
+        rec["_validation_status"] = r.get("_validation_status")  # may change without an edit
+        if r["_id"] not in local:
+            changes["added"] += 1
+        elif rec != local[r["_id"]]:
+            changes["updated"] += 1
+        results.append(rec)
+
+    alive_ids = {r["_id"] for r in results}
+    changes["removed"] = sum(1 for i in local if i not in alive_ids)
+
+    data = {"count": len(results), "fields_fingerprint": fingerprint, "results": results}
+    return data, changes
+
 def main():
     server = require_env("KOBO_SERVER")
     asset_uid = require_env("KOBO_ASSET_UID")
@@ -56,11 +186,14 @@ def main():
     out_dir = Path("docs/data")
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    data = fetch_all_submissions(server, asset_uid, token, page_size=300)
-
     out_path = out_dir / "submissions.json"
+    data, changes = sync_submissions(server, asset_uid, token, load_local(out_path), page_size=300)
+
     out_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"Wrote {data['count']} submissions to {out_path}")
+    print(
+        f"Wrote {data['count']} submissions to {out_path} "
+        f"(+{changes['added']} ~{changes['updated']} -{changes['removed']})"
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,251 @@
+"""
+Long-running alternative to the scheduled workflow: fetch -> transform -> recommendations -> trends,
+with submissions, flat rows and trend bins kept in memory between polls.
+
+    python scripts/sync_daemon.py [--min-interval 30] [--max-interval 900] [--once] [--publish]
+
+Run from the repository root with KOBO_SERVER / KOBO_ASSET_UID / KOBO_TOKEN set (as fetch_kobo.py).
+The wait between polls goes back to --min-interval whenever a poll brings changes and doubles
+(up to --max-interval) after each idle or failed poll. Artifacts under docs/data are only
+rewritten when something changed, each one atomically. Ctrl-C / SIGTERM stops after the current poll.
+
+With --publish, every flush is committed ("chore(data): auto sync Kobo data (daemon)"), rebased on
+origin/main and pushed, like the workflow does; the checkout needs push rights on main. Every poll
+also force-pushes an empty commit to refs/sync-daemon/heartbeat, changes or not.
+.github/workflows/sync-kobo.yml stays the default hosted sync (every 5 minutes); it only steps
+aside when the repository variable SYNC_DAEMON_ACTIVE is "true" AND the heartbeat is less than
+HEARTBEAT_TTL old, so a stopped daemon hands the sync back to the workflow on its own.
+If origin/main got data commits from elsewhere meanwhile (the workflow filling in, a manual fix),
+the daemon does not publish over them: it drops its unpushed data commit, moves to origin/main
+and reloads submissions and trend state from disk before the next flush.
+Without --publish the daemon only refreshes the local checkout (e.g. to preview the dashboard).
+"""
+import os
+import json
+import time
+import signal
+import subprocess
+import argparse
+import threading
+from pathlib import Path
+
+import trends
+from fetch_kobo import require_env, load_local, sync_submissions
+from transform import flatten_and_label, make_table_rows, build_stats, build_questions
+from analyze_recos import build_payload
+
+OUT_DIR = Path("docs/data")
+
+# Same files as the "Commit changes" step of .github/workflows/sync-kobo.yml, relative to the output dir
+ARTIFACTS = [
+    "submissions.json",
+    "submissions_flat.json",
+    "submissions_table.json",
+    "stats.json",
+    "questions.json",
+    "recommendations_global.json",
+    "trends_log.jsonl",
+    "trends_state.json",
+    "trends.json",
+]
+COMMIT_MESSAGE = "chore(data): auto sync Kobo data (daemon)"
+HEARTBEAT_REF = "refs/sync-daemon/heartbeat"
+HEARTBEAT_TTL = 1800  # seconds; keep in sync with the guard step of sync-kobo.yml
+
+
+def write_json_atomic(path: Path, obj, **dump_kwargs):
+    """
+    Writes to a temp file next to the target then renames it over: readers never see a partial file.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, **dump_kwargs), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def git(*args, check: bool = True, input: str = None) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], check=check, capture_output=True, text=True, input=input)
+
+
+def heartbeat():
+    """
+    Force-pushes an empty commit (committer date = now) to HEARTBEAT_REF: the workflow reads its
+    age to know whether a daemon is still publishing, whether or not the data changed.
+    """
+    tree = git("mktree", input="").stdout.strip()
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    commit = git("commit-tree", tree, "-m", f"sync daemon alive {stamp}").stdout.strip()
+    git("push", "--force", "origin", f"{commit}:{HEARTBEAT_REF}")
+
+
+def adopt_remote(artifacts: list):
+    """
+    Drops the daemon's unpushed data commits and artifact changes and moves to origin/main.
+    Refuses (RuntimeError) if a local commit ahead of origin/main is not one of ours.
+    """
+    ahead = git("log", "--format=%s", "origin/main..HEAD").stdout.splitlines()
+    if any(subject != COMMIT_MESSAGE for subject in ahead):
+        raise RuntimeError("origin/main has new data commits and HEAD has unpublished commits "
+                           "that are not the daemon's: resolve by hand")
+
+    tracked = git("ls-files", "--", *artifacts).stdout.splitlines()
+    if tracked:
+        git("checkout", "HEAD", "--", *tracked)
+    for path in set(artifacts) - set(tracked):
+        Path(path).unlink(missing_ok=True)
+    git("reset", "--keep", "origin/main")
+
+
+def publish(artifacts: list) -> bool:
+    """
+    Commits the artifacts (paths, if they changed), rebases on origin/main and pushes.
+    If origin/main touched the artifacts since our last sync, nothing is published: the checkout
+    is moved to origin/main (adopt_remote) and False is returned so the caller reloads its state.
+    """
+    git("fetch", "origin", "main")
+    if git("rev-list", "HEAD..origin/main", "--", *artifacts).stdout.strip():
+        print("origin/main has data commits from elsewhere: adopting them instead of publishing", flush=True)
+        adopt_remote(artifacts)
+        return False
+
+    git("add", *artifacts)
+    if git("diff", "--cached", "--quiet", check=False).returncode != 0:
+        git("commit", "-m", COMMIT_MESSAGE)
+
+    if git("rev-list", "--count", "origin/main..HEAD").stdout.strip() == "0":
+        return True
+    rebase = git("rebase", "--autostash", "origin/main", check=False)
+    if rebase.returncode != 0:
+        git("rebase", "--abort", check=False)
+        raise RuntimeError(f"git rebase failed: {rebase.stderr.strip()}")
+    git("push", "origin", "HEAD:main")
+    print("Published to origin/main", flush=True)
+    return True
+
+
+class SyncState:
+    """
+    Pipeline state kept warm between polls; loaded from disk once at startup.
+    """
+
+    def __init__(self, out_dir: Path = OUT_DIR, publish: bool = False):
+        self.out_dir = out_dir
+        self.publish_changes = publish
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.artifacts = [str(out_dir / name) for name in ARTIFACTS]
+        self.trends_log = out_dir / "trends_log.jsonl"
+        self.trends_state = out_dir / "trends_state.json"
+        self.trends_out = out_dir / "trends.json"
+        self.reload()
+        # Derived artifacts missing (fresh checkout) or a data commit left unpushed by a previous
+        # run: flush (and publish) on the first poll even without changes
+        self.dirty = not (out_dir / "recommendations_global.json").exists() or not self.trends_out.exists()
+        if publish and not self.dirty:
+            self.dirty = git("rev-list", "origin/main..HEAD", check=False).stdout.strip() != ""
+
+    def reload(self):
+        """
+        (Re)reads the submissions and the trend state from disk, e.g. after adopting origin/main.
+        """
+        self.local = load_local(self.out_dir / "submissions.json")
+        self.flat_cache = {}  # (_id, meta/instanceID) -> flat row
+        self.trends = trends.load_state(self.trends_state, self.trends_log)
+
+    def flatten(self, results: list) -> list:
+        """
+        Flat (consented) rows; submissions already seen in the same version (meta/instanceID)
+        are not re-labelled.
+        """
+        cache = {}
+        for r in results:
+            key = (r.get("_id"), r.get("meta/instanceID"))
+            cache[key] = self.flat_cache.get(key) or flatten_and_label(r)
+        self.flat_cache = cache
+        return [f for f in cache.values() if f.get("consent") == "Oui"]
+
+    def poll(self, server: str, asset_uid: str, token: str) -> bool:
+        """
+        One sync cycle. Returns True if the local copy changed.
+        """
+        if self.publish_changes:
+            heartbeat()
+        data, changes = sync_submissions(server, asset_uid, token, self.local, page_size=300)
+        changed = any(changes.values())
+        if changed:
+            print(f"Sync: +{changes['added']} ~{changes['updated']} -{changes['removed']}", flush=True)
+        if changed or self.dirty:
+            # Only move the warm copy forward once the artifacts are on disk: after a failed
+            # flush the next poll sees the same changes again and retries.
+            self.dirty = True
+            self.flush(data)
+            self.local = data
+            if self.publish_changes and not publish(self.artifacts):
+                # Someone else's data is now on disk: rebuild from it on the next poll
+                self.reload()
+                return True
+            self.dirty = False
+        return changed
+
+    def flush(self, data: dict):
+        flat_rows = self.flatten(data["results"])
+        stats = build_stats(flat_rows)
+        events = trends.diff_rows(self.trends, flat_rows)
+
+        d = self.out_dir
+        write_json_atomic(d / "submissions.json", data, indent=2)
+        write_json_atomic(d / "submissions_flat.json", flat_rows, indent=2)
+        write_json_atomic(d / "submissions_table.json", make_table_rows(flat_rows), indent=2)
+        write_json_atomic(d / "stats.json", stats, indent=2)
+        write_json_atomic(d / "questions.json", build_questions(), indent=2)
+        write_json_atomic(d / "recommendations_global.json", build_payload(stats, flat_rows), indent=2)
+
+        if events:
+            trends.record_events(self.trends, events, log_path=self.trends_log)
+            trends.save_state(self.trends, state_path=self.trends_state)
+        write_json_atomic(self.trends_out, trends.build_trends(self.trends), separators=(",", ":"))
+
+        print(f"Flushed {len(flat_rows)} rows, {len(events)} trend events -> {d}", flush=True)
+
+
+def run(min_interval: float, max_interval: float, once: bool = False, publish: bool = False):
+    server = require_env("KOBO_SERVER")
+    asset_uid = require_env("KOBO_ASSET_UID")
+    token = require_env("KOBO_TOKEN")
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    state = SyncState(publish=publish)
+    interval = min_interval
+    while not stop.is_set():
+        try:
+            changed = state.poll(server, asset_uid, token)
+        except Exception as e:
+            # Network, disk or unexpected payload: keep running, back off like an idle poll
+            print(f"Sync failed: {type(e).__name__}: {e}", flush=True)
+            changed = False
+
+        if once:
+            break
+        interval = min_interval if changed else min(interval * 2, max_interval)
+        print(f"Next poll in {interval:g}s", flush=True)
+        stop.wait(interval)
+
+    print("Stopped.", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep docs/data in sync with Kobo.")
+    parser.add_argument("--min-interval", type=float, default=30, help="seconds between polls while active")
+    parser.add_argument("--max-interval", type=float, default=900, help="upper bound of the idle back-off")
+    parser.add_argument("--once", action="store_true", help="run a single poll and exit")
+    parser.add_argument("--publish", action="store_true", help="commit, rebase on origin/main and push each flush")
+    args = parser.parse_args()
+    if args.publish and args.max_interval > HEARTBEAT_TTL / 2:
+        parser.error(f"--max-interval must be at most {HEARTBEAT_TTL // 2}s with --publish "
+                     f"(the workflow takes over once the heartbeat is older than {HEARTBEAT_TTL}s)")
+    run(args.min_interval, args.max_interval, once=args.once, publish=args.publish)
+
+
+if __name__ == "__main__":
+    main()
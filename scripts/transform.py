@@ -32,6 +32,27 @@ def count_multi(rows, field):
             c[it] += 1
     return dict(c)
 
+# Raw Kobo fields read by flatten_and_label (+ submission identity/metadata).
+# fetch_kobo.py requests these plus every sec* question of the deployed form
+# (fetch_form_fields); listing a field here keeps it for older form versions too.
+# Any change to the requested list forces a full re-pull (see fetch_kobo.fields_fingerprint).
+SOURCE_FIELDS = [
+    "_id", "_uuid", "meta/instanceID", "_submission_time", "_validation_status",
+    "consent",
+    "sec1/ministere", "sec1/ministere_autre", "sec1/sexe", "sec1/fonction",
+    "sec1/annees_experience_ministere", "sec1/formation_genre", "sec1/formation_genre_details",
+    "sec2/compr_genre", "sec2/diff_sexe_genre", "sec2/genre_biologique",
+    "sec2/politiques_genre_connaissance", "sec2/politiques_genre_liste",
+    "sec2/importance_genre_politiques_publiques", "sec2/importance_justification",
+    "sec3/cellule_genre", "sec3/nb_points_focaux", "sec3/plan_action_genre", "sec3/indicateurs_genre",
+    "sec3/outils_guide_genre", "sec3/budget_genre_annuel", "sec3/frequence_formations_genre",
+    "sec4/importance_genre_secteur", "sec4/obstacles", "sec4/obstacle_autre",
+    "sec4/actions", "sec4/action_autre",
+    "sec5/gtg_connaissance", "sec5/sgtgtg_connus",
+    "sec6/recommandations",
+    "sec6_fps/fps_connaissance", "sec7/recommandations",
+]
+
 TABLE_SCHEMA = [
     ("Ministere", "sec1/ministere_display"),
     ("Sexe", "sec1/sexe"),
@@ -95,6 +116,9 @@ DASHBOARD_QUESTIONS = [
 
 def flatten_and_label(rec: dict) -> dict:
     flat = {}
+    for k in ("_id", "_uuid", "_submission_time"):
+        if k in rec:
+            flat[k] = rec[k]
     flat["consent"] = map_one(rec.get("consent"), YES_NO)
 
     for k, v in rec.items():
@@ -166,6 +190,23 @@ def make_table_rows(flat_rows):
         rows.append(row)
     return rows
 
+def build_stats(flat_rows):
+    stats = {"n": len(flat_rows), "counters": {}, "multi": {}}
+
+    for section, title, field, chart in DASHBOARD_QUESTIONS:
+        if chart == "bar_multi":
+            continue
+        stats["counters"][field] = count_single(flat_rows, field)
+
+    stats["multi"]["sec4/obstacles_display"] = count_multi(flat_rows, "sec4/obstacles_display")
+    stats["multi"]["sec4/actions_display"] = count_multi(flat_rows, "sec4/actions_display")
+    stats["multi"]["sec5/sgtgtg_connus_display"] = count_multi(flat_rows, "sec5/sgtgtg_connus_display")
+
+    return stats
+
+def build_questions():
+    return [{"section": s, "title": t, "field": f, "chart": c} for (s,t,f,c) in DASHBOARD_QUESTIONS]
+
 def main():
     in_path = Path("docs/data/submissions.json")
     out_flat = Path("docs/data/submissions_flat.json")
@@ -181,22 +222,8 @@ def main():
 
     out_flat.write_text(json.dumps(flat_rows, ensure_ascii=False, indent=2), encoding="utf-8")
     out_table.write_text(json.dumps(make_table_rows(flat_rows), ensure_ascii=False, indent=2), encoding="utf-8")
-
-    stats = {"n": len(flat_rows), "counters": {}, "multi": {}}
-
-    for section, title, field, chart in DASHBOARD_QUESTIONS:
-        if chart == "bar_multi":
-            continue
-        stats["counters"][field] = count_single(flat_rows, field)
-
-    stats["multi"]["sec4/obstacles_display"] = count_multi(flat_rows, "sec4/obstacles_display")
-    stats["multi"]["sec4/actions_display"] = count_multi(flat_rows, "sec4/actions_display")
-    stats["multi"]["sec5/sgtgtg_connus_display"] = count_multi(flat_rows, "sec5/sgtgtg_connus_display")
-
-    out_stats.write_text(json.dumps(stats, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    q = [{"section": s, "title": t, "field": f, "chart": c} for (s,t,f,c) in DASHBOARD_QUESTIONS]
-    out_questions.write_text(json.dumps(q, ensure_ascii=False, indent=2), encoding="utf-8")
+    out_stats.write_text(json.dumps(build_stats(flat_rows), ensure_ascii=False, indent=2), encoding="utf-8")
+    out_questions.write_text(json.dumps(build_questions(), ensure_ascii=False, indent=2), encoding="utf-8")
 
     print("Wrote outputs OK")
 
@@ -0,0 +1,217 @@
+import os
+import json
+from pathlib import Path
+from datetime import datetime, date
+
+from analyze_recos import SIGNALS, pct
+
+FLAT_PATH = Path("docs/data/submissions_flat.json")
+LOG_PATH = Path("docs/data/trends_log.jsonl")     # append-only: one add/remove event per line
+STATE_PATH = Path("docs/data/trends_state.json")  # per-bin counters + seen submissions + log offset applied
+OUT_PATH = Path("docs/data/trends.json")
+
+SCALES = ("day", "week")
+TREND_FIELDS = sorted({field for _, field, _ in SIGNALS})
+
+
+def bin_key(day: str, scale: str) -> str:
+    if scale == "day":
+        return day
+    y, w, _ = date.fromisoformat(day).isocalendar()
+    return f"{y}-W{w:02d}"
+
+
+def row_values(row: dict) -> dict:
+    """
+    Category per tracked field for one flat row (same _missing convention as transform.count_single).
+    """
+    out = {}
+    for field in TREND_FIELDS:
+        v = row.get(field)
+        out[field] = "_missing" if v is None or str(v).strip() == "" else str(v)
+    return out
+
+
+def empty_state() -> dict:
+    return {"seen": {}, "bins": {scale: {} for scale in SCALES}, "log_offset": 0}
+
+
+def apply_event(state: dict, ev: dict):
+    """
+    Applies one add/remove event to the bins it falls in (and only those).
+    """
+    sign = 1 if ev["op"] == "add" else -1
+    for scale in SCALES:
+        key = bin_key(ev["day"], scale)
+        b = state["bins"][scale].setdefault(key, {"n": 0, "counters": {}})
+        b["n"] += sign
+        for field, v in ev["values"].items():
+            c = b["counters"].setdefault(field, {})
+            c[v] = c.get(v, 0) + sign
+            if c[v] == 0:
+                del c[v]
+        if b["n"] == 0:
+            del state["bins"][scale][key]
+
+    sid = str(ev["_id"])
+    if sign > 0:
+        state["seen"][sid] = {"_uuid": ev.get("_uuid"), "day": ev["day"], "values": ev["values"]}
+    else:
+        state["seen"].pop(sid, None)
+
+
+def diff_rows(state: dict, flat_rows: list) -> list:
+    """
+    Events needed to bring the state in line with the current flat rows:
+    new submissions are added, edited ones removed then re-added, vanished ones removed.
+    """
+    events = []
+    current = set()
+    for r in flat_rows:
+        if r.get("_id") is None or not r.get("_submission_time"):
+            continue
+        sid = str(r["_id"])
+        current.add(sid)
+        day = str(r["_submission_time"])[:10]
+        values = row_values(r)
+        prev = state["seen"].get(sid)
+        if prev and prev["_uuid"] == r.get("_uuid") and prev["day"] == day and prev["values"] == values:
+            continue
+        if prev:
+            events.append({"op": "remove", "_id": r["_id"], **prev})
+        events.append({"op": "add", "_id": r["_id"], "_uuid": r.get("_uuid"), "day": day, "values": values})
+
+    for sid, prev in state["seen"].items():
+        if sid not in current:
+            events.append({"op": "remove", "_id": int(sid) if sid.isdigit() else sid, **prev})
+
+    return events
+
+
+def replay_log(state: dict, log_path: Path = LOG_PATH) -> int:
+    """
+    Applies the log past state["log_offset"]: events appended by a run that stopped before
+    saving the state are applied once, not re-diffed. Returns the number of events applied.
+    """
+    if not log_path.exists():
+        state["log_offset"] = 0
+        return 0
+
+    applied = 0
+    with log_path.open("r+b") as f:
+        f.seek(state["log_offset"])
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Torn last write: never applied, drop it so the next append starts clean
+                f.truncate(state["log_offset"])
+                break
+            if line.strip():
+                apply_event(state, json.loads(line))
+                applied += 1
+            state["log_offset"] += len(line)
+    return applied
+
+
+def read_state(state_path: Path = STATE_PATH, log_path: Path = LOG_PATH) -> dict:
+    """
+    The materialized state as saved (empty, i.e. log_offset 0, if there is no state file).
+    """
+    if not state_path.exists():
+        return empty_state()
+    state = json.loads(state_path.read_text(encoding="utf-8"))
+    state.setdefault("log_offset", log_path.stat().st_size if log_path.exists() else 0)
+    return state
+
+
+def load_state(state_path: Path = STATE_PATH, log_path: Path = LOG_PATH) -> dict:
+    """
+    Loads the materialized state and catches up on the log tail (the whole log if there is no state file).
+    """
+    state = read_state(state_path, log_path)
+    replay_log(state, log_path)
+    return state
+
+
+def save_state(state: dict, state_path: Path = STATE_PATH):
+    """
+    Atomic write (temp file + rename): the state on disk is always a complete snapshot.
+    """
+    tmp = state_path.with_name(state_path.name + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, state_path)
+
+
+def record_events(state: dict, events: list, log_path: Path = LOG_PATH):
+    """
+    Appends events to the log and applies them to the in-memory state.
+    The caller saves the state afterwards (save_state).
+    """
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with log_path.open("ab") as f:
+        for ev in events:
+            apply_event(state, ev)
+            f.write((json.dumps(ev, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+        state["log_offset"] = f.tell()
+
+
+def series(bins: dict) -> dict:
+    """
+    Columnar per-bin and cumulative signals, ready for charting.
+    Cumulative counters are a running sum over bins, not over submissions.
+    """
+    keys = sorted(bins)
+    out = {
+        "bins": keys,
+        "n": [],
+        "n_cum": [],
+        "per_bin": {name: [] for name, _, _ in SIGNALS},
+        "cumulative": {name: [] for name, _, _ in SIGNALS},
+    }
+    n_cum = 0
+    cum = {field: {} for field in TREND_FIELDS}
+    for k in keys:
+        b = bins[k]
+        n_cum += b["n"]
+        out["n"].append(b["n"])
+        out["n_cum"].append(n_cum)
+        for field, c in b["counters"].items():
+            acc = cum.setdefault(field, {})
+            for v, cnt in c.items():
+                acc[v] = acc.get(v, 0) + cnt
+        for name, field, key in SIGNALS:
+            out["per_bin"][name].append(pct(b["counters"].get(field, {}), key))
+            out["cumulative"][name].append(pct(cum[field], key))
+    return out
+
+
+def build_trends(state: dict) -> dict:
+    return {
+        "generated_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "n": len(state["seen"]),
+        **{scale: series(state["bins"][scale]) for scale in SCALES},
+    }
+
+
+def main():
+    if not FLAT_PATH.exists():
+        raise FileNotFoundError(f"Missing file: {FLAT_PATH}. Run transform.py first.")
+
+    flat_rows = json.loads(FLAT_PATH.read_text(encoding="utf-8"))
+    state = read_state()
+    replayed = replay_log(state)
+    events = diff_rows(state, flat_rows)
+
+    if events:
+        record_events(state, events)
+    if events or replayed:
+        save_state(state)
+
+    if events or replayed or not OUT_PATH.exists():
+        OUT_PATH.write_text(
+            json.dumps(build_trends(state), ensure_ascii=False, separators=(",", ":")), encoding="utf-8"
+        )
+    print(f"Applied {len(events)} trend events ({replayed} replayed from log) -> {OUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()